@@ -1,52 +1,149 @@
 from flask import Flask, request, abort
 from linebot import LineBotApi, WebhookHandler
 from linebot.exceptions import InvalidSignatureError, LineBotApiError
+from linebot.http_client import RequestsHttpClient, RequestsHttpResponse
 from linebot.models import (
     MessageEvent, TextMessage, ImageMessage, TextSendMessage
 )
 import os
-import tempfile
-import base64
+import copy
+import atexit
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter, Retry
 from dotenv import load_dotenv
+from config import Config
 from ocr_processor import OCRProcessor
 from database import Database
 
 load_dotenv()
 
+class DeferredQueueHandler(QueueHandler):
+    """メッセージへの引数の埋め込みだけ行い、日時やトレースバックの整形は出力スレッドに任せる"""
+    
+    def prepare(self, record):
+        # 引数は後から書き換えられる可能性があるので、この時点の内容でメッセージを確定する
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+# ログは別スレッドで整形・出力する（リクエスト処理中のスレッドがトレースバックの整形や標準出力への書き込みで詰まらないように）
+_log_queue = queue.SimpleQueue()
+_log_handler = DeferredQueueHandler(_log_queue)
+_log_output = logging.StreamHandler()
+_log_output.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+logging.basicConfig(level=(os.getenv('LOG_LEVEL') or 'INFO').upper(), handlers=[_log_handler])
+_log_listener = QueueListener(_log_queue, _log_output)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
 
 LINE_TOKEN = os.getenv('LINE_CHANNEL_ACCESS_TOKEN')
 LINE_SECRET = os.getenv('LINE_CHANNEL_SECRET')
 
-line_bot_api = LineBotApi(LINE_TOKEN)
+# LINE APIへの接続を使い回すためのセッション（リクエストごとのTLSハンドシェイクを省く）
+line_session = requests.Session()
+line_session.mount('https://', HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=32,
+    max_retries=Retry(total=2, backoff_factor=0.1)
+))
+
+class SessionHttpClient(RequestsHttpClient):
+    """共有セッション経由でリクエストするLINE SDK用HTTPクライアント"""
+    
+    def get(self, url, headers=None, params=None, stream=False, timeout=None):
+        response = line_session.get(
+            url, headers=headers, params=params, stream=stream,
+            timeout=timeout or self.timeout
+        )
+        return RequestsHttpResponse(response)
+    
+    def post(self, url, headers=None, data=None, timeout=None):
+        response = line_session.post(
+            url, headers=headers, data=data, timeout=timeout or self.timeout
+        )
+        return RequestsHttpResponse(response)
+    
+    def delete(self, url, headers=None, data=None, timeout=None):
+        response = line_session.delete(
+            url, headers=headers, data=data, timeout=timeout or self.timeout
+        )
+        return RequestsHttpResponse(response)
+    
+    def put(self, url, headers=None, data=None, timeout=None):
+        response = line_session.put(
+            url, headers=headers, data=data, timeout=timeout or self.timeout
+        )
+        return RequestsHttpResponse(response)
+
+line_bot_api = LineBotApi(LINE_TOKEN, timeout=10, http_client=SessionHttpClient)
 handler = WebhookHandler(LINE_SECRET)
 
-# Google認証情報をBase64から復元
-if os.getenv('GOOGLE_CREDENTIALS_BASE64'):
-    try:
-        credentials_json = base64.b64decode(os.getenv('GOOGLE_CREDENTIALS_BASE64')).decode('utf-8')
-        with open('/tmp/google-credentials.json', 'w') as f:
-            f.write(credentials_json)
-        os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = '/tmp/google-credentials.json'
-        print("✅ Google credentials loaded from environment variable")
-    except Exception as e:
-        print(f"❌ Error loading Google credentials: {e}")
-else:
-    print("⚠️ GOOGLE_CREDENTIALS_BASE64 not found in environment variables")
+# 画像ダウンロード時の読み込み単位（SDKの既定は1KB）
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# LINE APIやSupabaseへの待ち時間を重ねるためのスレッドプール
+executor = ThreadPoolExecutor(max_workers=16)
+
+# Google認証情報をBase64から復元（ファイルには書き出さずメモリ上で読み込む）
+google_credentials = None
+try:
+    google_credentials = Config.google_credentials()
+    if google_credentials:
+        logger.info("✅ Google credentials loaded from environment variable")
+    else:
+        logger.warning("⚠️ GOOGLE_CREDENTIALS_BASE64 not found in environment variables")
+except Exception as e:
+    logger.exception("❌ Error loading Google credentials: %s", e)
 
 # OCRとデータベースを初期化
 try:
-    ocr = OCRProcessor()
+    ocr = OCRProcessor(credentials=google_credentials, cache_dir=os.getenv('OCR_CACHE_DIR'))
     db = Database()
-    print("✅ Supabase connected")
-    print("✅ OCR and Database initialized")
+    logger.info("✅ OCR and Database initialized")
 except Exception as e:
-    print(f"❌ Initialization error: {e}")
-    import traceback
-    traceback.print_exc()
+    logger.exception("❌ Initialization error: %s", e)
     ocr = None
     db = None
 
+# 一覧・検索結果に表示する項目
+LIST_FIELDS = (('name', '👤'), ('company', '🏢'), ('email', '📧'), ('phone', '📞'))
+SEARCH_FIELDS = (('name', '👤'), ('company', '🏢'))
+
+# 読み取り結果に表示する項目
+RESULT_FIELDS = (
+    ('name', '👤 名前'), ('company', '🏢 会社'), ('email', '📧 メール'),
+    ('phone', '📞 電話'), ('mobile', '📱 携帯')
+)
+
+def format_namecards(header, namecards, fields):
+    """名刺一覧の返信テキストを作成"""
+    parts = [header]
+    for i, card in enumerate(namecards, 1):
+        parts.append(f"【{i}】\n")
+        for key, label in fields:
+            if card.get(key):
+                parts.append(f"{label} {card[key]}\n")
+        parts.append("\n")
+    return ''.join(parts)
+
+def get_user(line_user_id):
+    """LINEのプロフィールからユーザーを取得または作成"""
+    # 直近に解決済みのユーザーならLINE APIもSupabaseも呼ばない
+    user = db.get_cached_user(line_user_id)
+    if user:
+        return user
+    
+    profile = line_bot_api.get_profile(line_user_id)
+    return db.get_or_create_user(line_user_id, profile.display_name)
+
 @app.route("/")
 def hello():
     return "Namecard Reader Bot is running! v5.0 - Simple OCR"
@@ -61,7 +158,7 @@ def callback():
     except InvalidSignatureError:
         abort(400)
     except Exception as e:
-        print(f"❌ Error: {e}")
+        logger.exception("❌ Error: %s", e)
     
     return 'OK'
 
@@ -79,8 +176,7 @@ def handle_text_message(event):
             )
             return
         
-        profile = line_bot_api.get_profile(line_user_id)
-        user = db.get_or_create_user(line_user_id, profile.display_name)
+        user = get_user(line_user_id)
         
         if user_message == "使い方" or user_message == "ヘルプ":
             reply_text = """📇 名刺読み取りBotの使い方
@@ -104,19 +200,9 @@ def handle_text_message(event):
             if not namecards:
                 reply_text = "まだ名刺が登録されていません。\n名刺の写真を送ってください！"
             else:
-                reply_text = f"📇 保存済み名刺（最新{len(namecards)}件）\n\n"
-                
-                for i, card in enumerate(namecards, 1):
-                    reply_text += f"【{i}】\n"
-                    if card.get('name'):
-                        reply_text += f"👤 {card['name']}\n"
-                    if card.get('company'):
-                        reply_text += f"🏢 {card['company']}\n"
-                    if card.get('email'):
-                        reply_text += f"📧 {card['email']}\n"
-                    if card.get('phone'):
-                        reply_text += f"📞 {card['phone']}\n"
-                    reply_text += "\n"
+                reply_text = format_namecards(
+                    f"📇 保存済み名刺（最新{len(namecards)}件）\n\n", namecards, LIST_FIELDS
+                )
         
         elif user_message.startswith("検索 "):
             keyword = user_message[3:].strip()
@@ -129,15 +215,9 @@ def handle_text_message(event):
                 if not namecards:
                     reply_text = f"「{keyword}」に一致する名刺が見つかりませんでした。"
                 else:
-                    reply_text = f"🔍 検索結果: {len(namecards)}件\n\n"
-                    
-                    for i, card in enumerate(namecards[:10], 1):
-                        reply_text += f"【{i}】\n"
-                        if card.get('name'):
-                            reply_text += f"�� {card['name']}\n"
-                        if card.get('company'):
-                            reply_text += f"🏢 {card['company']}\n"
-                        reply_text += "\n"
+                    reply_text = format_namecards(
+                        f"🔍 検索結果: {len(namecards)}件\n\n", namecards[:10], SEARCH_FIELDS
+                    )
         
         elif user_message == "テスト":
             reply_text = "✅ システム正常動作中！\n\n名刺の写真を送ってみてください。"
@@ -151,9 +231,7 @@ def handle_text_message(event):
         )
     
     except Exception as e:
-        print(f"❌ Text error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Text error: %s", e)
 
 @handler.add(MessageEvent, message=ImageMessage)
 def handle_image_message(event):
@@ -168,8 +246,8 @@ def handle_image_message(event):
             )
             return
         
-        profile = line_bot_api.get_profile(line_user_id)
-        user = db.get_or_create_user(line_user_id, profile.display_name)
+        # ユーザー情報の取得は画像のダウンロード・OCRと独立しているので並行して行う
+        user_future = executor.submit(get_user, line_user_id)
         
         line_bot_api.reply_message(
             event.reply_token,
@@ -179,13 +257,19 @@ def handle_image_message(event):
         message_id = event.message.id
         message_content = line_bot_api.get_message_content(message_id)
         
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
-            for chunk in message_content.iter_content():
-                temp_file.write(chunk)
-            temp_file_path = temp_file.name
+        # 一時ファイルを経由せずメモリ上の画像をそのままOCRに渡す
+        content = b''.join(message_content.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE))
+        
+        # 明らかに名刺ではない画像はOCRせずに返す
+        if not ocr.looks_like_namecard(content):
+            line_bot_api.push_message(
+                line_user_id,
+                TextSendMessage(text="❌ 名刺の画像ではないようです。\n名刺全体が写るように撮影して送ってください。")
+            )
+            return
         
         # OCR処理
-        result = ocr.process_image(temp_file_path)
+        result = ocr.process_image(content=content)
         
         if not result:
             result_text = "❌ 名刺からテキストを検出できませんでした。"
@@ -200,25 +284,19 @@ def handle_image_message(event):
                 result_text = "❌ 名刺情報を抽出できませんでした。"
             else:
                 # データベースに保存
+                user = user_future.result()
                 saved = db.save_namecard(user['id'], card_info)
                 
                 if saved:
-                    db.increment_monthly_usage(user['id'])
-                    
-                    result_text = "✅ 名刺を読み取って保存しました！\n\n"
+                    # 使用回数の更新は返信を待たせずにバックグラウンドで行う
+                    executor.submit(db.increment_monthly_usage, user['id'])
                     
-                    if card_info.get('name'):
-                        result_text += f"👤 名前: {card_info['name']}\n"
-                    if card_info.get('company'):
-                        result_text += f"🏢 会社: {card_info['company']}\n"
-                    if card_info.get('email'):
-                        result_text += f"📧 メール: {card_info['email']}\n"
-                    if card_info.get('phone'):
-                        result_text += f"📞 電話: {card_info['phone']}\n"
-                    if card_info.get('mobile'):
-                        result_text += f"📱 携帯: {card_info['mobile']}\n"
-                    
-                    result_text += "\n💾 データベースに保存しました\n「一覧」で確認できます"
+                    parts = ["✅ 名刺を読み取って保存しました！\n\n"]
+                    for key, label in RESULT_FIELDS:
+                        if card_info.get(key):
+                            parts.append(f"{label}: {card_info[key]}\n")
+                    parts.append("\n💾 データベースに保存しました\n「一覧」で確認できます")
+                    result_text = ''.join(parts)
                 else:
                     result_text = "❌ データベースへの保存に失敗しました。"
         
@@ -227,12 +305,8 @@ def handle_image_message(event):
             TextSendMessage(text=result_text)
         )
         
-        os.unlink(temp_file_path)
-        
     except Exception as e:
-        print(f"❌ Image error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("❌ Image error: %s", e)
         
         try:
             line_bot_api.push_message(
@@ -244,5 +318,5 @@ def handle_image_message(event):
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
-    print(f"\n🚀 Namecard Bot Starting on port {port}\n")
+    logger.info("🚀 Namecard Bot Starting on port %d", port)
     app.run(host="0.0.0.0", port=port, debug=False)
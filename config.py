@@ -2,6 +2,7 @@ import os
 import base64
 import json
 from dotenv import load_dotenv
+from google.oauth2 import service_account
 
 load_dotenv()
 
@@ -17,21 +18,22 @@ class Config:
     # Google Cloud設定
     GOOGLE_APPLICATION_CREDENTIALS = os.getenv('GOOGLE_APPLICATION_CREDENTIALS', 'google-credentials.json')
     
-    # 本番環境の場合、Base64エンコードされた認証情報を使用
-    if not os.path.exists(GOOGLE_APPLICATION_CREDENTIALS) and os.getenv('GOOGLE_CREDENTIALS_BASE64'):
-        try:
-            credentials_json = base64.b64decode(os.getenv('GOOGLE_CREDENTIALS_BASE64')).decode('utf-8')
-            # 一時ファイルに書き込み
-            with open('/tmp/google-credentials.json', 'w') as f:
-                f.write(credentials_json)
-            GOOGLE_APPLICATION_CREDENTIALS = '/tmp/google-credentials.json'
-            print("✅ Google credentials loaded from environment variable")
-        except Exception as e:
-            print(f"❌ Error loading Google credentials: {e}")
-    
     # Flask設定
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key')
     
+    @staticmethod
+    def google_credentials():
+        """Base64エンコードされたサービスアカウント情報から認証情報を作成
+        
+        本番環境用。ファイルには書き出さずメモリ上で読み込む。
+        未設定の場合はNoneを返し、GOOGLE_APPLICATION_CREDENTIALS のファイルが使われる。
+        """
+        encoded = os.getenv('GOOGLE_CREDENTIALS_BASE64')
+        if not encoded:
+            return None
+        info = json.loads(base64.b64decode(encoded).decode('utf-8'))
+        return service_account.Credentials.from_service_account_info(info)
+    
     @staticmethod
     def validate():
         """必須の環境変数がセットされているか確認"""
@@ -1,7 +1,28 @@
 from supabase import create_client, Client
 import os
+import logging
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
+# LINEユーザーID→ユーザー行のキャッシュ（プロフィール取得とSELECTを省く）
+USER_CACHE_SIZE = 4096
+USER_CACHE_TTL = 600  # 秒
+
+# 一覧・検索結果のキャッシュ（名刺の保存・削除時に該当ユーザー分を破棄）
+LIST_CACHE_USERS = 1024
+LIST_CACHE_KEYS = 16  # ユーザーごとに保持する一覧・検索結果の件数
+LIST_CACHE_TTL = 30  # 秒
+
+# 一覧・検索で返す列（full_text / address などの長い列は詳細取得時のみ）
+LIST_COLUMNS = 'id,name,company,email,phone,mobile'
+
+# DB関数が存在しないことを示すエラーコード（PostgRESTのスキーマキャッシュにない / PostgreSQLのundefined_function）
+MISSING_FUNCTION_CODES = ('PGRST202', '42883')
+
 class Database:
     def __init__(self):
         """Supabaseクライアントを初期化"""
@@ -12,35 +33,93 @@ class Database:
             raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in .env file")
         
         self.client: Client = create_client(supabase_url, supabase_key)
-        print("✅ Supabase connected")
+        self._user_cache = OrderedDict()
+        self._user_cache_lock = threading.Lock()
+        self._list_cache = OrderedDict()
+        self._list_cache_lock = threading.Lock()
+        # search_namecards 関数が未作成（マイグレーション未適用）と分かったらRPCを呼ばない
+        self._search_rpc_available = True
+        logger.info("✅ Supabase connected")
+    
+    def get_cached_user(self, line_user_id: str):
+        """キャッシュ済みのユーザーを取得（期限切れ・未登録ならNone）"""
+        with self._user_cache_lock:
+            entry = self._user_cache.get(line_user_id)
+            if entry is None:
+                return None
+            cached_at, user = entry
+            if time.monotonic() - cached_at > USER_CACHE_TTL:
+                del self._user_cache[line_user_id]
+                return None
+            self._user_cache.move_to_end(line_user_id)
+            return user
+    
+    def _cache_user(self, line_user_id: str, user: dict):
+        """ユーザーをキャッシュに保存（古いものから削除）"""
+        with self._user_cache_lock:
+            self._user_cache[line_user_id] = (time.monotonic(), user)
+            self._user_cache.move_to_end(line_user_id)
+            while len(self._user_cache) > USER_CACHE_SIZE:
+                self._user_cache.popitem(last=False)
+    
+    def _list_cache_get(self, user_id: str, key: tuple):
+        """キャッシュ済みの一覧・検索結果を取得（期限切れ・未登録ならNone）
+        
+        呼び出し側で書き換えられてもキャッシュが変わらないようコピーを返す
+        """
+        with self._list_cache_lock:
+            entries = self._list_cache.get(user_id)
+            if not entries or key not in entries:
+                return None
+            cached_at, data = entries[key]
+            if time.monotonic() - cached_at > LIST_CACHE_TTL:
+                del entries[key]
+                return None
+            entries.move_to_end(key)
+            self._list_cache.move_to_end(user_id)
+        return [dict(row) for row in data]
+    
+    def _list_cache_put(self, user_id: str, key: tuple, data: list):
+        """一覧・検索結果をキャッシュに保存（期限切れ・古いキーと古いユーザーから削除）"""
+        data = [dict(row) for row in data]
+        now = time.monotonic()
+        with self._list_cache_lock:
+            entries = self._list_cache.setdefault(user_id, OrderedDict())
+            # 検索キーワードごとに増えないよう、保存のたびに期限切れを消して件数も抑える
+            for old_key in [k for k, (cached_at, _) in entries.items() if now - cached_at > LIST_CACHE_TTL]:
+                del entries[old_key]
+            entries[key] = (now, data)
+            entries.move_to_end(key)
+            while len(entries) > LIST_CACHE_KEYS:
+                entries.popitem(last=False)
+            self._list_cache.move_to_end(user_id)
+            while len(self._list_cache) > LIST_CACHE_USERS:
+                self._list_cache.popitem(last=False)
+    
+    def _invalidate(self, user_id: str):
+        """ユーザーの一覧・検索結果のキャッシュを破棄"""
+        with self._list_cache_lock:
+            self._list_cache.pop(user_id, None)
     
     def get_or_create_user(self, line_user_id: str, display_name: str = None):
         """ユーザーを取得または作成"""
         try:
-            # ユーザーを検索
+            # line_user_id の一意制約を使ったUPSERTで、取得と作成を1回の往復で行う
+            # plan / monthly_usage は新規作成時にテーブルの初期値が入る
+            user = {'line_user_id': line_user_id}
+            if display_name:
+                user['display_name'] = display_name
+            
             response = self.client.table('users')\
-                .select('*')\
-                .eq('line_user_id', line_user_id)\
+                .upsert(user, on_conflict='line_user_id')\
                 .execute()
             
-            if response.data:
-                print(f"👤 User found: {line_user_id}")
-                return response.data[0]
-            
-            # 新規ユーザー作成
-            new_user = {
-                'line_user_id': line_user_id,
-                'display_name': display_name,
-                'plan': 'free',
-                'monthly_usage': 0
-            }
-            
-            response = self.client.table('users').insert(new_user).execute()
-            print(f"👤 New user created: {line_user_id}")
+            logger.debug("👤 User resolved: %s", line_user_id)
+            self._cache_user(line_user_id, response.data[0])
             return response.data[0]
         
         except Exception as e:
-            print(f"❌ Error in get_or_create_user: {e}")
+            logger.error("❌ Error in get_or_create_user: %s", e)
             return None
     
     def save_namecard(self, user_id: str, namecard_data: dict):
@@ -59,60 +138,109 @@ class Database:
             }
             
             response = self.client.table('namecards').insert(namecard).execute()
-            print(f"💾 Namecard saved: {namecard.get('name')}")
+            self._invalidate(user_id)
+            logger.debug("💾 Namecard saved: %s", namecard.get('name'))
             return response.data[0] if response.data else None
         
         except Exception as e:
-            print(f"❌ Error in save_namecard: {e}")
+            logger.error("❌ Error in save_namecard: %s", e)
             return None
     
     def get_user_namecards(self, user_id: str, limit: int = 10):
         """ユーザーの名刺一覧を取得（最新順）"""
+        cached = self._list_cache_get(user_id, ('list', limit))
+        if cached is not None:
+            return cached
+        
         try:
             response = self.client.table('namecards')\
-                .select('*')\
+                .select(LIST_COLUMNS)\
                 .eq('user_id', user_id)\
                 .order('created_at', desc=True)\
                 .limit(limit)\
                 .execute()
             
+            self._list_cache_put(user_id, ('list', limit), response.data)
             return response.data
         
         except Exception as e:
-            print(f"❌ Error in get_user_namecards: {e}")
+            logger.error("❌ Error in get_user_namecards: %s", e)
             return []
     
     def search_namecards(self, user_id: str, keyword: str):
         """名刺を検索"""
+        cached = self._list_cache_get(user_id, ('search', keyword))
+        if cached is not None:
+            return cached
+        
+        if self._search_rpc_available:
+            try:
+                # トライグラム索引を使うDB関数で検索（supabase/migrations の search_namecards）
+                response = self.client.rpc('search_namecards', {
+                    'uid': user_id,
+                    'keyword': keyword
+                }).execute()
+                
+                self._list_cache_put(user_id, ('search', keyword), response.data)
+                return response.data
+            
+            except Exception as e:
+                if getattr(e, 'code', None) in MISSING_FUNCTION_CODES:
+                    self._search_rpc_available = False
+                    logger.warning("⚠️ search_namecards function not found, using ilike from now on: %s", e)
+                else:
+                    logger.warning("⚠️ search_namecards RPC failed, falling back to ilike: %s", e)
+        
         try:
             # Supabaseの検索機能を使用
             response = self.client.table('namecards')\
-                .select('*')\
+                .select(LIST_COLUMNS)\
                 .eq('user_id', user_id)\
                 .or_(f'name.ilike.%{keyword}%,company.ilike.%{keyword}%,email.ilike.%{keyword}%')\
                 .execute()
             
+            self._list_cache_put(user_id, ('search', keyword), response.data)
             return response.data
         
         except Exception as e:
-            print(f"❌ Error in search_namecards: {e}")
+            logger.error("❌ Error in search_namecards: %s", e)
             return []
     
     def get_all_user_namecards(self, user_id: str):
         """ユーザーの全名刺を取得"""
+        cached = self._list_cache_get(user_id, ('all',))
+        if cached is not None:
+            return cached
+        
         try:
             response = self.client.table('namecards')\
-                .select('*')\
+                .select('id,name,company')\
                 .eq('user_id', user_id)\
                 .order('created_at', desc=True)\
                 .execute()
             
+            self._list_cache_put(user_id, ('all',), response.data)
             return response.data
         
         except Exception as e:
-            print(f"❌ Error in get_all_user_namecards: {e}")
+            logger.error("❌ Error in get_all_user_namecards: %s", e)
             return []
     
+    def get_namecard_detail(self, namecard_id: str, user_id: str):
+        """名刺の全項目を取得（ユーザー確認付き）"""
+        try:
+            response = self.client.table('namecards')\
+                .select('*')\
+                .eq('id', namecard_id)\
+                .eq('user_id', user_id)\
+                .execute()
+            
+            return response.data[0] if response.data else None
+        
+        except Exception as e:
+            logger.error("❌ Error in get_namecard_detail: %s", e)
+            return None
+    
     def delete_namecard(self, namecard_id: str, user_id: str):
         """名刺を削除（ユーザー確認付き）"""
         try:
@@ -122,32 +250,21 @@ class Database:
                 .eq('user_id', user_id)\
                 .execute()
             
+            self._invalidate(user_id)
             return True
         
         except Exception as e:
-            print(f"❌ Error in delete_namecard: {e}")
+            logger.error("❌ Error in delete_namecard: %s", e)
             return False
     
     def increment_monthly_usage(self, user_id: str):
         """月間使用回数を増やす"""
         try:
-            # 現在の使用回数を取得
-            response = self.client.table('users')\
-                .select('monthly_usage')\
-                .eq('id', user_id)\
-                .execute()
-            
-            if response.data:
-                current_usage = response.data[0].get('monthly_usage', 0)
-                
-                # 使用回数を+1
-                self.client.table('users')\
-                    .update({'monthly_usage': current_usage + 1})\
-                    .eq('id', user_id)\
-                    .execute()
+            # DB側で加算する（supabase/migrations の increment_usage 関数）
+            self.client.rpc('increment_usage', {'uid': user_id}).execute()
             
             return True
         
         except Exception as e:
-            print(f"❌ Error in increment_monthly_usage: {e}")
+            logger.error("❌ Error in increment_monthly_usage: %s", e)
             return False
\ No newline at end of file
@@ -1,201 +1,616 @@
 import os
+import io
+import asyncio
+import logging
+import copy
+import hashlib
+import threading
+import time
+import itertools
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from google.cloud import vision
+from google.cloud.vision_v1.services.image_annotator.transports import ImageAnnotatorGrpcTransport
+from PIL import Image, ImageOps
 import re
 
+logger = logging.getLogger(__name__)
+
+# 同一画像の再送時にVision APIを呼ばないためのキャッシュ件数
+CACHE_SIZE = 512
+_MISS = object()
+
+# OCRテキストのファイルキャッシュの保存期間（名刺の個人情報を含むので期限を過ぎたら削除する）
+TEXT_CACHE_TTL = 7 * 24 * 60 * 60  # 秒
+TEXT_CACHE_SWEEP_INTERVAL = 256    # この回数書き込むごとに期限切れのファイルを削除する
+# キャッシュが書き込むファイル名（保存先に他のファイルがあっても削除しないよう、これ以外は触らない）
+_TEXT_CACHE_NAME_RE = re.compile(r'[0-9a-f]{32}\.txt(?:\.\d+\.\d+\.tmp)?')
+
+# Vision APIに送る画像の長辺の上限（名刺のOCR精度はこれ以下で十分）
+MAX_IMAGE_SIZE = 1600
+JPEG_QUALITY = 85
+
+# 明らかに名刺ではない画像の判定基準（Vision APIを呼ばずに返す）
+MIN_CARD_SIDE = 200        # 短辺がこれ未満の画像は小さすぎる
+MAX_CARD_ASPECT = 3.0      # 長辺/短辺がこれを超える細長い画像は除外
+
+# 複数画像をまとめて処理するときのVision API同時呼び出し数
+MAX_OCR_WORKERS = 8
+
+# 1回のVision API呼び出しにまとめる画像の枚数（APIの上限は16枚）
+VISION_BATCH_SIZE = 16
+# 1回の呼び出しに含める画像の合計サイズ（APIのリクエストサイズ上限10MBに余裕を持たせる）
+VISION_BATCH_BYTES = 8 * 1024 * 1024
+
+# Vision APIの応答を待つ上限（秒）。応答が返らないままワーカーのスレッドを塞がないように
+VISION_TIMEOUT = 30
+
+# Vision APIのgRPCチャネル設定（アイドル後の初回呼び出しで再接続しないようkeepaliveを送る）
+GRPC_CHANNEL_OPTIONS = [
+    ('grpc.max_send_message_length', -1),
+    ('grpc.max_receive_message_length', -1),
+    ('grpc.keepalive_time_ms', 30000),
+    ('grpc.keepalive_timeout_ms', 10000),
+    ('grpc.keepalive_permit_without_calls', 1),
+    ('grpc.http2.max_pings_without_data', 0),
+]
+
+# 抽出用の正規表現（呼び出しごとにコンパイルしないようモジュール読み込み時に用意）
+_EMAIL_RE = re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
+_EMAIL_LOOSE_RE = re.compile(r'[a-zA-Z0-9._%+-]+[@＠][a-zA-Z0-9.-]+[\.。][a-zA-Z]{2,}')
+_EMAIL_TRANS = str.maketrans('＠。', '@.')
+
+# 全角数字→半角数字（抽出済みの短い文字列に使う。OCR全文のような長い非ASCII文字列ではreplaceの方が速い）
+_ZEN2HAN_TRANS = str.maketrans('０１２３４５６７８９', '0123456789')
+
+# 電話番号・携帯番号の候補（ラベルの有無は番号の直前を見て判定する）
+# 種類ごとに別々に走査する（1つの正規表現にまとめると、前の候補が次の番号の数字を消費してしまう）
+_PHONE_HYPHEN_RE = re.compile(r'[0-9０-９]{2,4}[-ー－][0-9０-９]{2,4}[-ー－][0-9０-９]{4}')
+_PHONE_DIGITS_RE = re.compile(r'[0-9０-９]{9,11}')
+_PHONE_LABEL_RE = re.compile(r'(TEL|電話|℡|Mobile|携帯)$', re.IGNORECASE)
+_PHONE_LABEL_MAX_LEN = 6
+_PHONE_LABEL_SEPARATORS = ':：'
+_MOBILE_NUMBER_RE = re.compile(r'[0-9０-９]{3}[-ー－][0-9０-９]{4}[-ー－][0-9０-９]{4}')
+_PHONE_LABELS = ('tel', '電話', '℡')
+_MOBILE_LABELS = ('mobile', '携帯', 'tel')
+_WORD_RE = re.compile(r'\w')
+_DIGIT_RE = re.compile(r'[0-9０-９]')
+_MOBILE_PREFIXES = ('070', '080', '090')
+
+# 名前は行全体で照合する（fullmatchで使う）
+_NAME_JP_SPACE_RE = re.compile(r'([\u4E00-\u9FFF]{2,4})[\s　]+([\u4E00-\u9FFF]{1,4})')
+_NAME_JP_RE = re.compile(r'([\u4E00-\u9FFF]{2,5})')
+_NAME_JP_GIVEN_RE = re.compile(r'[\u4E00-\u9FFF]{1,3}')
+_NAME_EN_RE = re.compile(r'([A-Z][a-z]+)[\s　]+([A-Z][a-z]+)')
+_NAME_CAPS_RE = re.compile(r'([A-Z]{2,})[\s　]+([A-Z]{2,})')
+
+_COMPANY_KEYWORDS = (
+    '株式会社', '有限会社', '合同会社', '合資会社',
+    '社団法人', '財団法人', '医療法人', '学校法人',
+    r'Co\.', r'Ltd\.', r'Inc\.', 'Corporation', r'Corp\.',
+    r'K\.K\.', 'GK', 'LLC', 'Limited'
+)
+# IGNORECASEだとリテラルの前方一致最適化が効かないため、小文字化した行に対して照合する
+_COMPANY_RE = re.compile('|'.join(_COMPANY_KEYWORDS).lower())
+
+_PREFECTURES = (
+    '北海道', '青森県', '岩手県', '宮城県', '秋田県', '山形県', '福島県',
+    '茨城県', '栃木県', '群馬県', '埼玉県', '千葉県', '東京都', '神奈川県',
+    '新潟県', '富山県', '石川県', '福井県', '山梨県', '長野県', '岐阜県',
+    '静岡県', '愛知県', '三重県', '滋賀県', '京都府', '大阪府', '兵庫県',
+    '奈良県', '和歌山県', '鳥取県', '島根県', '岡山県', '広島県', '山口県',
+    '徳島県', '香川県', '愛媛県', '高知県', '福岡県', '佐賀県', '長崎県',
+    '熊本県', '大分県', '宮崎県', '鹿児島県', '沖縄県'
+)
+_PREF_RE = re.compile('|'.join(map(re.escape, _PREFECTURES)))
+_ZIP_RE = re.compile(r'[〒〠][0-9０-９]{3}[-ー－]?[0-9０-９]{4}')
+_ADDRESS_STOP_WORDS = ('TEL', 'FAX', 'Email', '@', 'http')
+
+_WEBSITE_RES = [re.compile(p, re.IGNORECASE) for p in (
+    r'https?://[^\s]+',
+    r'www\.[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}',
+    r'[a-zA-Z0-9.-]+\.(?:com|co\.jp|jp|net|org|info|biz)'
+)]
+
+# 認証情報ごとのVision APIクライアント（OCRProcessorを複数作ってもgRPCチャネルは使い回す）
+# キーは既定の認証情報かサービスアカウントのメールアドレスなので、プロセス内で数件にしかならない
+_clients = {}
+_clients_lock = threading.Lock()
+
+def _client_key(credentials):
+    """共有クライアントのキー（同じサービスアカウントなら同じキー、共有できない認証情報ならNone）"""
+    if credentials is None:
+        return 'default'
+    email = getattr(credentials, 'service_account_email', None)
+    return ('service_account', email) if email else None
+
+def _create_client(credentials=None):
+    """keepaliveを設定したgRPCチャネルでVision APIクライアントを作成"""
+    # credentialsがNoneの場合はGOOGLE_APPLICATION_CREDENTIALSなどの既定の認証情報を使う
+    channel = ImageAnnotatorGrpcTransport.create_channel(
+        credentials=credentials,
+        options=GRPC_CHANNEL_OPTIONS
+    )
+    return vision.ImageAnnotatorClient(
+        transport=ImageAnnotatorGrpcTransport(channel=channel)
+    )
+
+def _get_client(credentials=None):
+    """Vision APIクライアントを取得（共有できる認証情報なら初回のみ作成）"""
+    key = _client_key(credentials)
+    if key is None:
+        # サービスアカウント以外の認証情報はインスタンスごとに作る（プロセス内に溜め込まない）
+        return _create_client(credentials)
+    
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _create_client(credentials)
+            _clients[key] = client
+        return client
+
 class OCRProcessor:
-    def __init__(self, credentials_path=None):
-        self.client = vision.ImageAnnotatorClient()
+    def __init__(self, credentials=None, cache_size=CACHE_SIZE, cache_dir=None, cache_ttl=TEXT_CACHE_TTL):
+        self.client = _get_client(credentials)
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        # gunicornのgthreadワーカーでは複数スレッドから同時に参照される
+        self._cache_lock = threading.Lock()
+        # OCRテキストをファイルにも保存する場合の保存先（再起動後や他のワーカーとも共有できる）
+        self.cache_dir = cache_dir
+        self.cache_ttl = cache_ttl
+        self._cache_writes = itertools.count(1)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._sweep_text_cache()
     
-    def process_image(self, image_path):
-        """画像から名刺情報を抽出（改良版）"""
+    def process_image(self, image_path=None, content=None):
+        """画像から名刺情報を抽出（改良版）
+        
+        ファイルパスまたは画像のバイト列のどちらかを受け取る
+        """
         try:
-            print(f"🔍 Processing: {image_path}")
-            text = self.ocr_image(image_path)
-            
-            if not text or not text.strip():
-                print("⚠️ No text detected")
-                return None
+            key, content, result = self._load_image(image_path, content)
+            if result is not _MISS:
+                return result
             
-            print(f"📝 Detected text:\n{text}\n")
-            
-            info = {
-                'name': self.extract_name(text),
-                'company': self.extract_company(text),
-                'email': self.extract_email(text),
-                'phone': self.extract_phone(text),
-                'mobile': self.extract_mobile(text),
-                'address': self.extract_address(text),
-                'website': self.extract_website(text),
-                'full_text': text
-            }
+            text = self.ocr_bytes(content)
+            self._write_text_cache(key, text)
+            return self._build_result(key, text)
+        
+        except Exception as e:
+            logger.exception("❌ OCR error: %s", e)
+            return None
+    
+    def _load_image(self, image_path, content):
+        """画像を読み込み、キャッシュ済みなら抽出結果も返す
+        
+        (キー, 画像のバイト列, 抽出結果) を返す。Vision APIを呼ぶ必要がある場合、抽出結果は_MISS
+        """
+        if content is None:
+            logger.debug("🔍 Processing: %s", image_path)
+            with open(image_path, 'rb') as f:
+                content = f.read()
+        else:
+            logger.debug("🔍 Processing: %d bytes", len(content))
+        
+        # 同じ画像なら前回の抽出結果を返す
+        key = hashlib.blake2b(content, digest_size=16).digest()
+        cached = self._cache_get(key)
+        if cached is not _MISS:
+            logger.debug("♻️ Cache hit")
+            return key, content, cached
+        
+        text = self._read_text_cache(key)
+        if text is not None:
+            return key, content, self._build_result(key, text)
+        
+        return key, content, _MISS
+    
+    def _build_result(self, key, text):
+        """OCRテキストから抽出結果を作成してキャッシュに保存"""
+        if not text or not text.strip():
+            logger.info("⚠️ No text detected")
+            self._cache_put(key, None)
+            return None
+        
+        logger.debug("📝 Detected text:\n%s", text)
+        
+        info = self.extract_info_from_text(text)
+        
+        logger.debug(
+            "✅ Extracted: name=%s company=%s email=%s phone=%s",
+            info.get('name'), info.get('company'), info.get('email'), info.get('phone')
+        )
+        
+        result = [info] if (info.get('name') or info.get('company')) else None
+        self._cache_put(key, result)
+        return result
+    
+    async def process_image_async(self, image_path=None, content=None):
+        """process_imageの非同期版（asyncio.gatherで複数の画像のOCRを重ねられる）
+        
+        gRPCの呼び出しは別スレッドで行い、イベントループは塞がない
+        """
+        return await asyncio.to_thread(self.process_image, image_path, content)
+    
+    def process_images(self, image_paths=None, contents=None, max_workers=MAX_OCR_WORKERS):
+        """複数の画像から名刺情報を抽出（結果は渡した順に並ぶ）
+        
+        ファイルパスのリストまたは画像のバイト列のリストのどちらかを受け取る。
+        キャッシュにない画像は枚数と合計サイズの上限までまとめて1回のVision API呼び出しにし、
+        呼び出しが複数になる場合はスレッドで並行して行う
+        """
+        if contents is not None:
+            sources = [(None, content) for content in contents]
+        else:
+            sources = [(image_path, None) for image_path in image_paths]
+        
+        results = [None] * len(sources)
+        pending = []  # Vision APIに問い合わせる (位置, キー, 画像)
+        for index, (image_path, content) in enumerate(sources):
+            try:
+                key, content, result = self._load_image(image_path, content)
+                if result is not _MISS:
+                    results[index] = result
+                else:
+                    pending.append((index, key, content))
             
-            print(f"✅ Extracted:")
-            print(f"  Name: {info.get('name', 'None')}")
-            print(f"  Company: {info.get('company', 'None')}")
-            print(f"  Email: {info.get('email', 'None')}")
-            print(f"  Phone: {info.get('phone', 'None')}")
+            except Exception as e:
+                logger.exception("❌ OCR error: %s", e)
+        
+        if not pending:
+            return results
+        
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(pending))) as executor:
+            # まとめる前に縮小しておき、送信する実際のサイズでまとめ方を決める
+            images = executor.map(self.shrink_image, [content for _, _, content in pending])
+            pending = [(index, key, image) for (index, key, _), image in zip(pending, images)]
             
-            return [info] if (info.get('name') or info.get('company')) else None
+            for batch_results in executor.map(self._process_batch, self._split_batches(pending)):
+                for index, result in batch_results:
+                    results[index] = result
+        
+        return results
+    
+    def _split_batches(self, pending):
+        """1回の呼び出しの枚数と合計サイズが上限を超えないように分ける"""
+        batches = []
+        batch, batch_bytes = [], 0
+        for item in pending:
+            size = len(item[2])
+            if batch and (len(batch) >= VISION_BATCH_SIZE or batch_bytes + size > VISION_BATCH_BYTES):
+                batches.append(batch)
+                batch, batch_bytes = [], 0
+            batch.append(item)
+            batch_bytes += size
+        if batch:
+            batches.append(batch)
+        return batches
+    
+    def _process_batch(self, batch):
+        """縮小済みの画像をまとめてOCRし、(位置, 抽出結果) のリストを返す"""
+        results = [(index, None) for index, _, _ in batch]
+        try:
+            responses = self._call_vision_batch([image for _, _, image in batch])
+            for i, ((index, key, _), response) in enumerate(zip(batch, responses)):
+                if response.error.message:
+                    logger.error("❌ OCR error: API Error: %s", response.error.message)
+                    continue
+                
+                text = response.full_text_annotation.text
+                self._write_text_cache(key, text)
+                results[i] = (index, self._build_result(key, text))
         
         except Exception as e:
-            print(f"❌ Error: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("❌ OCR error: %s", e)
+        
+        return results
+    
+    def extract_info_from_text(self, text):
+        """OCRテキストから各項目を抽出"""
+        # 行分割と空白除去は各抽出処理で共通なので一度だけ行う
+        lines = tuple(line.strip() for line in text.split('\n'))
+        text_cleaned = text.replace(' ', '').replace('　', '')
+        phone_text = text_cleaned.replace('ー', '-').replace('−', '-')
+        phone, mobile = self.extract_phones(phone_text)
+        
+        return {
+            'name': self.extract_name(lines),
+            'company': self.extract_company(lines),
+            'email': self.extract_email(text_cleaned),
+            'phone': phone,
+            'mobile': mobile,
+            'address': self.extract_address(lines),
+            'website': self.extract_website(text),
+            'full_text': text
+        }
+    
+    def _text_cache_path(self, key):
+        return os.path.join(self.cache_dir, f"{key.hex()}.txt")
+    
+    def _read_text_cache(self, key):
+        """ファイルに保存済みのOCRテキストを取得（未保存・期限切れ・読めない場合はNone）"""
+        if not self.cache_dir:
+            return None
+        path = self._text_cache_path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.cache_ttl:
+                os.remove(path)
+                return None
+            with open(path, encoding='utf-8') as f:
+                text = f.read()
+            logger.debug("♻️ OCR text cache hit")
+            return text
+        except FileNotFoundError:
             return None
+        except (OSError, UnicodeDecodeError) as e:
+            # 壊れたファイルや権限の問題ではVision APIで読み直す
+            logger.warning("⚠️ OCR text cache read failed: %s", e)
+            return None
+    
+    def _write_text_cache(self, key, text):
+        """OCRテキストをファイルに保存（書き込み途中のファイルを読まないよう置き換えで保存）"""
+        if not self.cache_dir:
+            return
+        path = self._text_cache_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text or '')
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("⚠️ OCR text cache write failed: %s", e)
+        
+        if next(self._cache_writes) % TEXT_CACHE_SWEEP_INTERVAL == 0:
+            self._sweep_text_cache()
     
-    def ocr_image(self, image_path):
-        """Google Cloud Vision APIでOCR"""
-        with open(image_path, 'rb') as f:
-            content = f.read()
+    def _sweep_text_cache(self):
+        """保存期間を過ぎたOCRテキストのファイル（書き込み途中で残ったものも含む）を削除
         
-        image = vision.Image(content=content)
-        response = self.client.text_detection(
-            image=image,
+        保存先のうち、このキャッシュが書き込んだ名前のファイルだけを対象にする
+        """
+        expires = time.time() - self.cache_ttl
+        try:
+            with os.scandir(self.cache_dir) as entries:
+                for entry in entries:
+                    try:
+                        if _TEXT_CACHE_NAME_RE.fullmatch(entry.name) and entry.is_file() \
+                                and entry.stat().st_mtime < expires:
+                            os.remove(entry.path)
+                    except OSError:
+                        pass
+        except OSError as e:
+            logger.warning("⚠️ OCR text cache sweep failed: %s", e)
+    
+    def _cache_get(self, key):
+        """キャッシュから抽出結果を取得（呼び出し側で書き換えられないようコピーを返す）"""
+        with self._cache_lock:
+            if key not in self._cache:
+                return _MISS
+            self._cache.move_to_end(key)
+            result = self._cache[key]
+        return copy.deepcopy(result)
+    
+    def _cache_put(self, key, result):
+        """抽出結果をキャッシュに保存（古いものから削除）"""
+        result = copy.deepcopy(result)
+        with self._cache_lock:
+            self._cache[key] = result
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+    
+    def looks_like_namecard(self, content):
+        """名刺の可能性がある画像か簡易判定（小さすぎる・細長すぎる画像を除外）"""
+        try:
+            # ヘッダーの画像サイズだけを見る（画素データはデコードしない）
+            width, height = Image.open(io.BytesIO(content)).size
+            short_side, long_side = min(width, height), max(width, height)
+            return short_side >= MIN_CARD_SIDE and long_side / short_side <= MAX_CARD_ASPECT
+        
+        except Exception as e:
+            # 判定できない画像はVision APIに任せる
+            logger.warning("⚠️ Card check skipped: %s", e)
+            return True
+    
+    def shrink_image(self, content):
+        """大きな画像を縮小・JPEG再圧縮して送信サイズを減らす"""
+        try:
+            img = Image.open(io.BytesIO(content))
+            if max(img.size) <= MAX_IMAGE_SIZE:
+                return content
+            
+            # 再保存でEXIFの向き情報が失われるので先に回転を反映する
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail((MAX_IMAGE_SIZE, MAX_IMAGE_SIZE), Image.LANCZOS)
+            out = io.BytesIO()
+            img.convert('RGB').save(out, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+            logger.debug("🗜️ Resized image: %d -> %d bytes", len(content), out.tell())
+            return out.getvalue()
+        
+        except Exception as e:
+            # 縮小できない場合は元の画像をそのまま送る
+            logger.warning("⚠️ Image resize skipped: %s", e)
+            return content
+    
+    def _annotate_request(self, image):
+        """Vision APIに送るテキスト検出のリクエストを作成（縮小済みの画像を受け取る）"""
+        return vision.AnnotateImageRequest(
+            image=vision.Image(content=image),
+            features=[vision.Feature(type_=vision.Feature.Type.TEXT_DETECTION)],
             image_context=vision.ImageContext(language_hints=['ja', 'en'])
         )
+    
+    def _call_vision_batch(self, images):
+        """縮小済みの複数の画像のテキスト検出を1回で呼び出し、画像ごとのレスポンスを返す（Vision APIの呼び出しはここだけ）"""
+        # text_detectionと同じくリトライはせず、待ち時間だけ上限を設ける
+        return self.client.batch_annotate_images(
+            requests=[self._annotate_request(image) for image in images],
+            retry=None,
+            timeout=VISION_TIMEOUT
+        ).responses
+    
+    def _call_vision(self, content):
+        """Vision APIのテキスト検出を呼び出してレスポンスを返す"""
+        response = self._call_vision_batch([self.shrink_image(content)])[0]
         
         if response.error.message:
             raise Exception(f'API Error: {response.error.message}')
         
-        return response.text_annotations[0].description if response.text_annotations else ""
+        return response
     
-    def extract_email(self, text):
-        """メールアドレスを抽出（改良版）"""
-        # スペースを削除
-        text_cleaned = text.replace(' ', '').replace('　', '')
+    def ocr_bytes(self, content):
+        """Google Cloud Vision APIでOCR（画像のバイト列を受け取る）"""
+        return self._call_vision(content).full_text_annotation.text
+    
+    def extract_email(self, text_cleaned):
+        """メールアドレスを抽出（改良版、空白除去済みのテキストを受け取る）"""
+        # @がなければ正規表現で全文を走査するまでもない
+        if '@' not in text_cleaned and '＠' not in text_cleaned:
+            return None
         
         # パターン1: 標準的なメールアドレス
-        emails = re.findall(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}', text_cleaned)
-        if emails:
-            return emails[0]
+        match = _EMAIL_RE.search(text_cleaned)
+        if match:
+            return match.group(0)
         
         # パターン2: カンマやスペースで区切られている場合
-        emails = re.findall(r'[a-zA-Z0-9._%+-]+[@＠][a-zA-Z0-9.-]+[\.。][a-zA-Z]{2,}', text_cleaned)
-        if emails:
-            return emails[0].replace('＠', '@').replace('。', '.')
+        match = _EMAIL_LOOSE_RE.search(text_cleaned)
+        if match:
+            return match.group(0).translate(_EMAIL_TRANS)
         
         return None
     
-    def extract_phone(self, text):
-        """固定電話番号を抽出（改良版）"""
-        text_cleaned = text.replace(' ', '').replace('　', '').replace('ー', '-').replace('−', '-')
-        
-        patterns = [
-            r'(?:TEL|Tel|tel|電話|℡)[:\s：]*([0-9０-９]{2,4}[-ー－][0-9０-９]{2,4}[-ー－][0-9０-９]{4})',
-            r'([0-9０-９]{2,4}[-ー－][0-9０-９]{2,4}[-ー－][0-9０-９]{4})',
-            r'(?:TEL|Tel|tel|電話|℡)[:\s：]*([0-9０-９]{9,11})',
-            r'\b([0-9０-９]{9,11})\b',
-        ]
-        
-        for pattern in patterns:
-            phones = re.findall(pattern, text_cleaned, re.IGNORECASE)
-            if phones:
-                phone = phones[0]
-                # 全角数字を半角に変換
-                phone = self.zen_to_han(phone)
-                # 携帯番号は除外
-                if not phone.startswith(('070', '080', '090')):
-                    return phone
+    def extract_phones(self, text_cleaned):
+        """固定電話番号と携帯電話番号を抽出（改良版、空白除去・ハイフン正規化済みのテキストを受け取る）"""
+        # 数字が1つもなければ番号の候補はない
+        if not _DIGIT_RE.search(text_cleaned):
+            return None, None
         
-        return None
+        return self._extract_phone(text_cleaned), self._extract_mobile(text_cleaned)
     
-    def extract_mobile(self, text):
-        """携帯電話番号を抽出（改良版）"""
-        text_cleaned = text.replace(' ', '').replace('　', '').replace('ー', '-').replace('−', '-')
+    def _phone_label(self, text, start):
+        """番号の直前にあるラベルを小文字で返す（ラベルがなければ空文字）"""
+        # ラベルと番号の間のコロンや改行を読み飛ばす
+        end = start
+        while end > 0 and (text[end - 1] in _PHONE_LABEL_SEPARATORS or text[end - 1].isspace()):
+            end -= 1
+        match = _PHONE_LABEL_RE.search(text, max(0, end - _PHONE_LABEL_MAX_LEN), end)
+        return match.group(1).lower() if match else ''
+    
+    def _extract_phone(self, text):
+        """固定電話番号を抽出
         
-        patterns = [
-            r'(?:Mobile|mobile|携帯|TEL|Tel)[:\s：]*([0-9０-９]{3}[-ー－][0-9０-９]{4}[-ー－][0-9０-９]{4})',
-            r'([0-9０-９]{3}[-ー－][0-9０-９]{4}[-ー－][0-9０-９]{4})',
-        ]
+        「ラベル付きハイフン区切り → ハイフン区切り → ラベル付き数字のみ → 数字のみ」の順に
+        それぞれ最初の候補を見て、携帯番号でない最初のものを採用する
+        """
+        first = labeled = None
+        for match in _PHONE_HYPHEN_RE.finditer(text):
+            if first is None:
+                first = match
+            if self._phone_label(text, match.start()) in _PHONE_LABELS:
+                labeled = match
+                break
         
-        for pattern in patterns:
-            mobiles = re.findall(pattern, text_cleaned, re.IGNORECASE)
-            for mobile in mobiles:
-                if 'FAX' not in mobile and 'fax' not in mobile:
-                    mobile = self.zen_to_han(mobile)
-                    if mobile.startswith(('070', '080', '090')):
-                        return mobile
+        for match in (labeled, first):
+            if match:
+                phone = self.zen_to_han(match.group(0))
+                if not phone.startswith(_MOBILE_PREFIXES):
+                    return phone
+        
+        labeled = bounded = None
+        for match in _PHONE_DIGITS_RE.finditer(text):
+            start, end = match.span()
+            if labeled is None and self._phone_label(text, start) in _PHONE_LABELS:
+                labeled = match
+            # ラベルなしの数字のみは前後が単語境界のものだけ
+            if bounded is None and \
+                    not (start > 0 and _WORD_RE.match(text[start - 1])) and \
+                    not (end < len(text) and _WORD_RE.match(text[end])):
+                bounded = match
+            if labeled and bounded:
+                break
+        
+        for match in (labeled, bounded):
+            if match:
+                phone = self.zen_to_han(match.group(0))
+                if not phone.startswith(_MOBILE_PREFIXES):
+                    return phone
         
         return None
     
-    def extract_name(self, text):
-        """名前を抽出（改良版）"""
-        lines = text.split('\n')
+    def _extract_mobile(self, text):
+        """携帯電話番号を抽出（ラベル付きのものを優先し、なければ最初に見つかったもの）"""
+        mobile = None
+        for match in _MOBILE_NUMBER_RE.finditer(text):
+            number = self.zen_to_han(match.group(0))
+            if not number.startswith(_MOBILE_PREFIXES):
+                continue
+            if self._phone_label(text, match.start()) in _MOBILE_LABELS:
+                return number
+            if mobile is None:
+                mobile = number
         
+        return mobile
+    
+    def extract_name(self, lines):
+        """名前を抽出（改良版、前後の空白を除去済みの行を受け取る）"""
         for i, line in enumerate(lines[:8]):
-            line = line.strip()
-            
-            # パターン1: 日本語の名前（姓名の間にスペース）
-            match = re.match(r'^([\u4E00-\u9FFF]{2,4})[\s　]+([\u4E00-\u9FFF]{1,4})$', line)
-            if match:
-                return f"{match.group(1)} {match.group(2)}"
+            if not line:
+                continue
             
-            # パターン2: 日本語の名前（スペースなし）
-            match = re.match(r'^([\u4E00-\u9FFF]{2,5})$', line)
-            if match and i < 3:  # 最初の3行のみ
-                # 次の行と組み合わせて判定
-                if i + 1 < len(lines):
-                    next_line = lines[i + 1].strip()
-                    if re.match(r'^[\u4E00-\u9FFF]{1,3}$', next_line):
-                        return f"{line} {next_line}"
-                return line
+            # 先頭の文字が漢字なら日本語、英大文字なら英語のパターンだけを試す
+            first = ord(line[0])
+            if 0x4E00 <= first <= 0x9FFF:
+                # パターン1: 日本語の名前（姓名の間にスペース）
+                match = _NAME_JP_SPACE_RE.fullmatch(line)
+                if match:
+                    return f"{match.group(1)} {match.group(2)}"
+                
+                # パターン2: 日本語の名前（スペースなし）
+                match = _NAME_JP_RE.fullmatch(line)
+                if match and i < 3:  # 最初の3行のみ
+                    # 次の行と組み合わせて判定
+                    if i + 1 < len(lines):
+                        next_line = lines[i + 1]
+                        if _NAME_JP_GIVEN_RE.fullmatch(next_line):
+                            return f"{line} {next_line}"
+                    return line
             
-            # パターン3: 英語の名前
-            match = re.match(r'^([A-Z][a-z]+)[\s　]+([A-Z][a-z]+)$', line)
-            if match:
-                return f"{match.group(1)} {match.group(2)}"
-            
-            # パターン4: ローマ字（ALL CAPS）
-            match = re.match(r'^([A-Z]{2,})[\s　]+([A-Z]{2,})$', line)
-            if match:
-                return f"{match.group(1)} {match.group(2)}"
+            elif 0x41 <= first <= 0x5A:
+                # パターン3: 英語の名前
+                match = _NAME_EN_RE.fullmatch(line)
+                if match:
+                    return f"{match.group(1)} {match.group(2)}"
+                
+                # パターン4: ローマ字（ALL CAPS）
+                match = _NAME_CAPS_RE.fullmatch(line)
+                if match:
+                    return f"{match.group(1)} {match.group(2)}"
         
         return None
     
-    def extract_company(self, text):
-        """会社名を抽出（改良版）"""
-        keywords = [
-            '株式会社', '有限会社', '合同会社', '合資会社',
-            '社団法人', '財団法人', '医療法人', '学校法人',
-            'Co\.', 'Ltd\.', 'Inc\.', 'Corporation', 'Corp\.',
-            'K\.K\.', 'GK', 'LLC', 'Limited'
-        ]
-        
-        lines = text.split('\n')
-        
+    def extract_company(self, lines):
+        """会社名を抽出（改良版、前後の空白を除去済みの行を受け取る）"""
         # キーワードを含む行を探す
         for line in lines[:15]:
-            line = line.strip()
-            for keyword in keywords:
-                if re.search(keyword, line, re.IGNORECASE):
-                    # 会社名として妥当な長さか確認
-                    if 3 <= len(line) <= 100:
-                        return line
+            # 会社名として妥当な長さの行だけ照合する
+            if 3 <= len(line) <= 100 and _COMPANY_RE.search(line.lower()):
+                return line
         
         return None
     
-    def extract_address(self, text):
-        """住所を抽出（改良版）"""
-        prefectures = [
-            '北海道', '青森県', '岩手県', '宮城県', '秋田県', '山形県', '福島県',
-            '茨城県', '栃木県', '群馬県', '埼玉県', '千葉県', '東京都', '神奈川県',
-            '新潟県', '富山県', '石川県', '福井県', '山梨県', '長野県', '岐阜県',
-            '静岡県', '愛知県', '三重県', '滋賀県', '京都府', '大阪府', '兵庫県',
-            '奈良県', '和歌山県', '鳥取県', '島根県', '岡山県', '広島県', '山口県',
-            '徳島県', '香川県', '愛媛県', '高知県', '福岡県', '佐賀県', '長崎県',
-            '熊本県', '大分県', '宮崎県', '鹿児島県', '沖縄県'
-        ]
-        
-        lines = text.split('\n')
-        
+    def extract_address(self, lines):
+        """住所を抽出（改良版、前後の空白を除去済みの行を受け取る）"""
         for i, line in enumerate(lines):
             # 郵便番号または都道府県を含む行
-            if re.search(r'[〒〠][0-9０-９]{3}[-ー－]?[0-9０-９]{4}', line) or any(pref in line for pref in prefectures):
+            if _ZIP_RE.search(line) or _PREF_RE.search(line):
                 address = line
                 # 次の行も住所の続きの可能性
                 if i + 1 < len(lines):
-                    next_line = lines[i + 1].strip()
-                    if not any(kw in next_line for kw in ['TEL', 'FAX', 'Email', '@', 'http']):
+                    next_line = lines[i + 1]
+                    if not any(kw in next_line for kw in _ADDRESS_STOP_WORDS):
                         address += ' ' + next_line
                 return address.strip()
         
@@ -203,23 +618,17 @@ class OCRProcessor:
     
     def extract_website(self, text):
         """Webサイトを抽出（改良版）"""
-        patterns = [
-            r'https?://[^\s]+',
-            r'www\.[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}',
-            r'[a-zA-Z0-9.-]+\.(com|co\.jp|jp|net|org|info|biz)'
-        ]
+        # どのパターンも「.」か「://」を含む
+        if '.' not in text and '://' not in text:
+            return None
         
-        for pattern in patterns:
-            websites = re.findall(pattern, text, re.IGNORECASE)
-            if websites:
-                return websites[0].strip()
+        for pattern in _WEBSITE_RES:
+            match = pattern.search(text)
+            if match:
+                return match.group(0).strip()
         
         return None
     
     def zen_to_han(self, text):
         """全角数字を半角に変換"""
-        zen = "０１２３４５６７８９"
-        han = "0123456789"
-        for z, h in zip(zen, han):
-            text = text.replace(z, h)
-        return text
+        return text.translate(_ZEN2HAN_TRANS)
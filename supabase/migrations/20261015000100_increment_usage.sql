@@ -0,0 +1,9 @@
+-- 月間使用回数を1回のUPDATEで加算する（SELECT→UPDATEの往復と競合による取りこぼしを防ぐ）
+create or replace function increment_usage(uid uuid)
+returns void
+language sql
+as $$
+    update users
+    set monthly_usage = coalesce(monthly_usage, 0) + 1
+    where id = uid;
+$$;
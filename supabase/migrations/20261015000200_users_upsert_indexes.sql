@@ -0,0 +1,9 @@
+-- get_or_create_user のUPSERT（on_conflict=line_user_id）に必要な一意制約
+create unique index if not exists users_line_user_id_key on users (line_user_id);
+
+-- UPSERTで新規作成される場合の初期値
+alter table users alter column plan set default 'free';
+alter table users alter column monthly_usage set default 0;
+
+-- get_user_namecards の WHERE user_id = ? ORDER BY created_at DESC LIMIT ? 用
+create index if not exists namecards_user_id_created_at_idx on namecards (user_id, created_at desc);
@@ -0,0 +1,29 @@
+-- search_namecards の部分一致検索（ilike '%キーワード%'）をインデックスで処理するためのトライグラム索引
+-- 注意: トライグラムは3文字単位のため、2文字以下のキーワード（日本語の姓の検索の多く）はこの索引を使えない。
+-- その場合は user_id の索引（namecards_user_id_created_at_idx）で絞ったそのユーザーの名刺だけを走査する。
+create extension if not exists pg_trgm;
+
+create index if not exists namecards_name_trgm_idx on namecards using gin (name gin_trgm_ops);
+create index if not exists namecards_company_trgm_idx on namecards using gin (company gin_trgm_ops);
+create index if not exists namecards_email_trgm_idx on namecards using gin (email gin_trgm_ops);
+
+-- 名前・会社名・メールの部分一致検索（類似度の高い順）
+create or replace function search_namecards(uid uuid, keyword text)
+returns setof namecards
+language sql
+stable
+as $$
+    select *
+    from namecards
+    where user_id = uid
+      and (
+          name ilike '%' || keyword || '%'
+          or company ilike '%' || keyword || '%'
+          or email ilike '%' || keyword || '%'
+      )
+    order by greatest(
+        similarity(coalesce(name, ''), keyword),
+        similarity(coalesce(company, ''), keyword),
+        similarity(coalesce(email, ''), keyword)
+    ) desc, created_at desc;
+$$;
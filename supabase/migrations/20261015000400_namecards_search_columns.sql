@@ -0,0 +1,29 @@
+-- 検索結果は一覧表示に使う列だけを返す（full_text / address など長い列を転送しない）
+drop function if exists search_namecards(uuid, text);
+
+create function search_namecards(uid uuid, keyword text)
+returns table (
+    id uuid,
+    name text,
+    company text,
+    email text,
+    phone text,
+    mobile text
+)
+language sql
+stable
+as $$
+    select n.id, n.name::text, n.company::text, n.email::text, n.phone::text, n.mobile::text
+    from namecards n
+    where n.user_id = uid
+      and (
+          n.name ilike '%' || keyword || '%'
+          or n.company ilike '%' || keyword || '%'
+          or n.email ilike '%' || keyword || '%'
+      )
+    order by greatest(
+        similarity(coalesce(n.name, ''), keyword),
+        similarity(coalesce(n.company, ''), keyword),
+        similarity(coalesce(n.email, ''), keyword)
+    ) desc, n.created_at desc;
+$$;